@@ -2,133 +2,394 @@
 """
 Python script for comparing trees
 Usage: python compare_trees.py <estimated_tree> <true_tree> <output_file>
+       python compare_trees.py --est-string <newick> --true-string <newick> <output_file>
+       python compare_trees.py --manifest <manifest_csv>
 """
 
 import sys
 import os
-import dendropy
-from dendropy.calculate import treecompare
+import csv
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import xxhash
+from numba import njit
+import pyximport
+pyximport.install(language_level=3)
+import fast_newick
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "phylo_rf")
+# Part of the cache key; bump whenever the cached split encoding changes
+SPLIT_CACHE_VERSION = 1
+
+def _read_nexus(path):
+    """Read a Nexus tree with DendroPy and flatten it to (parent, labels) arrays."""
+    # DendroPy is only needed for Nexus input, so keep it off the Newick path
+    import dendropy
+    tree = dendropy.Tree.get(
+        path=path,
+        schema="nexus",
+        preserve_underscores=True,
+        rooting="force-rooted"
+    )
+    node_ids = {}
+    parents = []
+    labels = []
+    for node in tree.preorder_node_iter():
+        node_ids[node] = len(parents)
+        parents.append(node_ids[node.parent_node] if node.parent_node is not None else -1)
+        labels.append(node.taxon.label if node.is_leaf() and node.taxon is not None else None)
+    return np.array(parents, dtype=np.int32), labels
+
+def _read_tree(path, name):
+    """Read a tree as (parent, labels) arrays (handle both Newick and Nexus formats)."""
+    try:
+        return fast_newick.parse_newick(path)
+    except fast_newick.ParseError as e:
+        print(f"Error reading {name} tree as Newick, trying Nexus: {e}")
+        return _read_nexus(path)
+
+@njit(cache=True)
+def _splits64(parent, leaf_bit):
+    """Return the nontrivial splits of a tree with at most 64 taxa as uint64 masks.
+
+    leaf_bit[i] is the single-bit mask of leaf i, or 0 for internal nodes and
+    taxa left out of the comparison (which projects the splits onto the
+    remaining taxa). Each split is canonicalized to the side holding bit 0.
+    """
+    n = parent.shape[0]
+    mask = leaf_bit.copy()
+    size = np.zeros(n, np.int64)
+    n_taxa = 0
+    for i in range(n):
+        if leaf_bit[i]:
+            size[i] = 1
+            n_taxa += 1
+    # Parents precede their children, so a reverse sweep is a postorder
+    for i in range(n - 1, -1, -1):
+        p = parent[i]
+        if p >= 0:
+            mask[p] |= mask[i]
+            size[p] += size[i]
+    full = np.uint64(0xFFFFFFFFFFFFFFFF) if n_taxa == 64 else (np.uint64(1) << np.uint64(n_taxa)) - np.uint64(1)
+    out = np.empty(n, np.uint64)
+    n_splits = 0
+    for i in range(n):
+        if 2 <= size[i] <= n_taxa - 2:
+            m = mask[i]
+            out[n_splits] = m if m & np.uint64(1) else ~m & full
+            n_splits += 1
+    return out[:n_splits]
+
+@njit(cache=True)
+def _splits_wide(parent, leaf_pos, k):
+    """Return the nontrivial splits of a tree as a (n_splits, k) uint64 matrix.
+
+    leaf_pos[i] is the bit position of leaf i, or -1 for internal nodes and
+    taxa left out of the comparison. Canonicalized like _splits64.
+    """
+    n = parent.shape[0]
+    mask = np.zeros((n, k), np.uint64)
+    size = np.zeros(n, np.int64)
+    n_taxa = 0
+    for i in range(n):
+        if leaf_pos[i] >= 0:
+            mask[i, leaf_pos[i] >> 6] = np.uint64(1) << np.uint64(leaf_pos[i] & 63)
+            size[i] = 1
+            n_taxa += 1
+    for i in range(n - 1, -1, -1):
+        p = parent[i]
+        if p >= 0:
+            for w in range(k):
+                mask[p, w] |= mask[i, w]
+            size[p] += size[i]
+    full = np.empty(k, np.uint64)
+    for w in range(k):
+        bits = min(64, n_taxa - 64 * w)
+        full[w] = np.uint64(0xFFFFFFFFFFFFFFFF) if bits == 64 else (np.uint64(1) << np.uint64(bits)) - np.uint64(1)
+    keep = np.zeros(n, np.bool_)
+    for i in range(n):
+        if size[i] < 2 or size[i] > n_taxa - 2:
+            continue
+        keep[i] = True
+        if not mask[i, 0] & np.uint64(1):
+            for w in range(k):
+                mask[i, w] = ~mask[i, w] & full[w]
+    return mask[keep]
+
+def _split_matrix(parents, labels, taxon_index):
+    """Return the (n_splits, k) split matrix of a tree with taxon_index mapping labels to bits."""
+    leaf_pos = np.fromiter(
+        (taxon_index.get(label, -1) if label is not None else -1 for label in labels),
+        dtype=np.int64,
+        count=len(labels)
+    )
+    if len(taxon_index) <= 64:
+        # Single-word fast path: one register-sized mask per node
+        leaf_bit = np.where(leaf_pos >= 0, np.left_shift(np.uint64(1), leaf_pos.clip(0).astype(np.uint64)), np.uint64(0))
+        return _splits64(parents, leaf_bit)[:, None]
+    return _splits_wide(parents, leaf_pos, (len(taxon_index) + 63) // 64)
+
+def _project_splits(mat, keep):
+    """Project a split matrix onto a subset of its taxa.
+
+    Bit j of each projected split is bit keep[j] of the original one. Splits
+    are re-canonicalized to the side holding the new bit 0, and those that
+    become trivial are dropped; duplicates are merged later by _split_keys.
+    """
+    bits = np.unpackbits(np.ascontiguousarray(mat).view(np.uint8), axis=1, bitorder='little')[:, keep]
+    bits[bits[:, 0] == 0] ^= 1
+    size = bits.sum(axis=1)
+    bits = bits[(size >= 2) & (size <= len(keep) - 2)]
+    packed = np.zeros((len(bits), 8 * ((len(keep) + 63) // 64)), np.uint8)
+    packed[:, :(len(keep) + 7) // 8] = np.packbits(bits, axis=1, bitorder='little')
+    return packed.view(np.uint64)
+
+def _label_hashes(labels):
+    """Return the xxh3_64 hashes of taxon labels as a uint64 array."""
+    return np.fromiter(
+        (xxhash.xxh3_64_intdigest(label.encode()) for label in labels),
+        dtype=np.uint64,
+        count=len(labels)
+    )
+
+def _split_keys(mat):
+    """Return (keys, rows): the sorted, de-duplicated uint64 keys of a split
+    matrix and the row each key came from.
+
+    Splits wider than 64 taxa are keyed by the xxh3_64 hash of their
+    little-endian words, read straight from the matrix buffer.
+    """
+    if mat.shape[1] == 1:
+        keys = mat[:, 0]
+    else:
+        mat = np.ascontiguousarray(mat)
+        keys = np.fromiter(
+            (xxhash.xxh3_64_intdigest(row) for row in mat),
+            dtype=np.uint64,
+            count=len(mat)
+        )
+    return np.unique(keys, return_index=True)
+
+def _count_common(true_mat, est_mat):
+    """Return (n_true, n_est, n_common) for two split matrices.
+
+    Matching wide splits are compared word by word as well, so a hash
+    collision can never be counted as a shared split.
+    """
+    true_keys, true_rows = _split_keys(true_mat)
+    est_keys, est_rows = _split_keys(est_mat)
+    _, true_idx, est_idx = np.intersect1d(true_keys, est_keys, assume_unique=True, return_indices=True)
+    if true_mat.shape[1] == 1:
+        n_common = true_idx.size
+    else:
+        n_common = int(np.all(true_mat[true_rows[true_idx]] == est_mat[est_rows[est_idx]], axis=1).sum())
+    return true_keys.size, est_keys.size, n_common
+
+def _build_splits(parents, labels):
+    """Return (taxa, splits) with bits assigned to the tree's own sorted leaf labels."""
+    taxa = sorted(set(label for label in labels if label is not None))
+    return taxa, _split_matrix(parents, labels, {label: i for i, label in enumerate(taxa)})
+
+def _load_or_build_splits(path, name="true"):
+    """Return (taxa, splits) for a tree file, cached on disk across invocations.
+
+    The cache key covers SPLIT_CACHE_VERSION, the path, its mtime and the first
+    4KB of content, so neither a rewritten tree file nor a change to the split
+    encoding is served stale splits.
+    """
+    with open(path, 'rb') as f:
+        head = hashlib.sha1(f.read(4096)).hexdigest()
+    key = hashlib.sha1(f"v{SPLIT_CACHE_VERSION}:{os.path.abspath(path)}:{os.path.getmtime(path)}:{head}".encode()).hexdigest()
+    cache_file = os.path.join(CACHE_DIR, f"{key}.npz")
+    try:
+        with np.load(cache_file) as cached:
+            return cached['taxa'].tolist(), cached['splits']
+    except (OSError, KeyError, ValueError):
+        pass
+    
+    taxa, splits = _build_splits(*_read_tree(path, name))
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, taxa=np.array(taxa, dtype=str), splits=splits)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"Warning: could not cache splits for {path}: {e}")
+    return taxa, splits
+
+def _write_error(output_file, e):
+    print(f"Error in tree comparison: {e}")
+    with open(output_file, 'w') as f:
+        f.write(f"Tree comparison error: {str(e)}\n")
+
+def _compare(true_taxa_list, true_mat, est_parents, est_labels):
+    """Compare an estimated tree against the true tree's splits.
+
+    Returns a dict with the taxon counts and RF, FN and FP (None when fewer
+    than 3 taxa are shared).
+    """
+    # Distinct leaf labels of the estimated tree, in tree order
+    est_taxa_list = list(dict.fromkeys(label for label in est_labels if label is not None))
+    
+    # Print some diagnostic information
+    print(f"True tree has {len(true_taxa_list)} taxa")
+    print(f"Estimated tree has {len(est_taxa_list)} taxa")
+    
+    # Find the taxa shared by both trees by joining their label hashes
+    _, true_idx, est_idx = np.intersect1d(
+        _label_hashes(true_taxa_list), _label_hashes(est_taxa_list),
+        assume_unique=True, return_indices=True
+    )
+    n_common = true_idx.size
+    
+    print(f"Trees share {n_common} taxa in common")
+    
+    result = {
+        'true_taxa': len(true_taxa_list),
+        'est_taxa': len(est_taxa_list),
+        'common_taxa': n_common,
+        'RF': None,
+        'FN': None,
+        'FP': None
+    }
+    
+    if n_common < 3:
+        print("WARNING: Less than 3 common taxa found. Tree comparison may not be valid.")
+        return result
+    
+    # Prune trees to common taxa only if the taxon sets differ: the true splits
+    # are projected onto the common taxa and the estimated tree gives no bit to
+    # taxa outside the set
+    if n_common == len(true_taxa_list) == len(est_taxa_list):
+        taxon_index = {label: i for i, label in enumerate(true_taxa_list)}
+    else:
+        print("Pruning trees to common taxa set")
+        true_mat = _project_splits(true_mat, true_idx)
+        taxon_index = {est_taxa_list[j]: i for i, j in enumerate(est_idx)}
+    
+    # Encode bipartitions for comparison
+    n_true, n_est, common = _count_common(true_mat, _split_matrix(est_parents, est_labels, taxon_index))
+    
+    # Calculate Robinson-Foulds distance
+    result['RF'] = n_true + n_est - 2 * common
+    
+    # Calculate FN rate (proportion of true splits missed)
+    result['FN'] = (n_true - common) / (n_true or 1)
+    
+    # Calculate FP rate (proportion of estimated splits not in true tree)
+    result['FP'] = (n_est - common) / (n_est or 1)
+    
+    return result
+
+def _write_results(output_file, result):
+    with open(output_file, 'w') as f:
+        f.write("Tree comparison results:\n")
+        if result['RF'] is None:
+            f.write("WARNING: Less than 3 common taxa found. Comparison not valid.\n")
+            f.write("Trees have different taxon sets.\n")
+            f.write(f"True tree taxa: {result['true_taxa']}\n")
+            f.write(f"Estimated tree taxa: {result['est_taxa']}\n")
+            f.write(f"Common taxa: {result['common_taxa']}\n")
+            f.write("RF distance: N/A\n")
+            f.write("FN rate: N/A\n")
+            f.write("FP rate: N/A\n")
+            return
+        f.write(f"RF distance: {result['RF']}\n")
+        f.write(f"FN rate: {result['FN']}\n")
+        f.write(f"FP rate: {result['FP']}\n")
+    
+    print(f"Tree comparison completed: {output_file}")
+
+def _compare_to_true(true_taxa_list, true_mat, estimated_tree_file, output_file):
+    """Compare an estimated tree file against the true tree's splits and write the results."""
+    try:
+        est_parents, est_labels = _read_tree(estimated_tree_file, "estimated")
+        result = _compare(true_taxa_list, true_mat, est_parents, est_labels)
+        _write_results(output_file, result)
+    except Exception as e:
+        _write_error(output_file, e)
+
+def compare_trees_from_strings(est_newick, true_newick):
+    """Compare two trees given as Newick strings, without any file I/O.
+
+    Returns the same dict as the file-based comparison: the taxon counts and
+    RF, FN and FP (None when fewer than 3 taxa are shared).
+    """
+    true_taxa_list, true_mat = _build_splits(*fast_newick.parse_newick_string(true_newick))
+    est_parents, est_labels = fast_newick.parse_newick_string(est_newick)
+    return _compare(true_taxa_list, true_mat, est_parents, est_labels)
+
+def _worker_count():
+    """Return the number of CPUs this job may use (not every core on the node)."""
+    if os.environ.get("SLURM_NTASKS"):
+        return int(os.environ["SLURM_NTASKS"])
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def compare_many(manifest_csv):
+    """Run every comparison listed in a manifest CSV in one process.
+
+    The manifest has true_tree, estimated_tree and output columns. The true
+    tree splits are loaded once per distinct true tree and shared by all of
+    its comparisons, which run in a process pool.
+    """
+    groups = {}
+    with open(manifest_csv, newline='') as f:
+        for row in csv.DictReader(f):
+            groups.setdefault(row['true_tree'], []).append((row['estimated_tree'], row['output']))
+    
+    with ProcessPoolExecutor(max_workers=_worker_count()) as executor:
+        futures = []
+        for true_tree_file, pairs in groups.items():
+            try:
+                true_taxa_list, true_mat = _load_or_build_splits(true_tree_file)
+            except Exception as e:
+                for _, output_file in pairs:
+                    _write_error(output_file, e)
+                continue
+            for estimated_tree_file, output_file in pairs:
+                futures.append(executor.submit(
+                    _compare_to_true, true_taxa_list, true_mat, estimated_tree_file, output_file
+                ))
+        for future in futures:
+            future.result()
 
 def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--manifest":
+        compare_many(sys.argv[2])
+        return
+    
+    if len(sys.argv) == 6 and sys.argv[1] == "--est-string" and sys.argv[3] == "--true-string":
+        output_file = sys.argv[5]
+        try:
+            result = compare_trees_from_strings(sys.argv[2], sys.argv[4])
+        except Exception as e:
+            _write_error(output_file, e)
+            return
+        _write_results(output_file, result)
+        return
+    
     if len(sys.argv) != 4:
         print("Usage: python compare_trees.py <estimated_tree> <true_tree> <output_file>")
+        print("       python compare_trees.py --est-string <newick> --true-string <newick> <output_file>")
+        print("       python compare_trees.py --manifest <manifest_csv>")
         sys.exit(1)
     
     estimated_tree_file = sys.argv[1]
     true_tree_file = sys.argv[2]
     output_file = sys.argv[3]
     
+    # Read the true tree splits (cached)
     try:
-        # Read trees using DendroPy with more flexible format recognition
-        taxa = dendropy.TaxonNamespace()
-        
-        # Try to read true tree (handle both Newick and Nexus formats)
-        try:
-            true_tree = dendropy.Tree.get(
-                path=true_tree_file,
-                schema="newick",
-                taxon_namespace=taxa,
-                preserve_underscores=True,
-                rooting="force-rooted"
-            )
-        except Exception as e:
-            print(f"Error reading true tree as Newick, trying Nexus: {e}")
-            true_tree = dendropy.Tree.get(
-                path=true_tree_file,
-                schema="nexus",
-                taxon_namespace=taxa,
-                preserve_underscores=True,
-                rooting="force-rooted"
-            )
-        
-        # Try to read estimated tree
-        try:
-            estimated_tree = dendropy.Tree.get(
-                path=estimated_tree_file,
-                schema="newick",
-                taxon_namespace=taxa,
-                preserve_underscores=True,
-                rooting="force-rooted"
-            )
-        except Exception as e:
-            print(f"Error reading estimated tree as Newick, trying Nexus: {e}")
-            estimated_tree = dendropy.Tree.get(
-                path=estimated_tree_file,
-                schema="nexus",
-                taxon_namespace=taxa,
-                preserve_underscores=True,
-                rooting="force-rooted"
-            )
-        
-        # Print some diagnostic information
-        print(f"True tree has {len(true_tree.taxon_namespace)} taxa")
-        print(f"Estimated tree has {len(estimated_tree.taxon_namespace)} taxa")
-        
-        # Ensure both trees are using the same taxon namespace
-        common_taxa = set(t.label for t in true_tree.taxon_namespace).intersection(
-            set(t.label for t in estimated_tree.taxon_namespace))
-        
-        print(f"Trees share {len(common_taxa)} taxa in common")
-        
-        if len(common_taxa) < 3:
-            print("WARNING: Less than 3 common taxa found. Tree comparison may not be valid.")
-            with open(output_file, 'w') as f:
-                f.write("Tree comparison results:\n")
-                f.write("WARNING: Less than 3 common taxa found. Comparison not valid.\n")
-                f.write("Trees have different taxon sets.\n")
-                f.write(f"True tree taxa: {len(true_tree.taxon_namespace)}\n")
-                f.write(f"Estimated tree taxa: {len(estimated_tree.taxon_namespace)}\n")
-                f.write(f"Common taxa: {len(common_taxa)}\n")
-                f.write("RF distance: N/A\n")
-                f.write("FN rate: N/A\n")
-                f.write("FP rate: N/A\n")
-            return
-        
-        # Prune trees to common taxa if needed
-        if len(common_taxa) < len(true_tree.taxon_namespace) or len(common_taxa) < len(estimated_tree.taxon_namespace):
-            print("Pruning trees to common taxa set")
-            common_taxa_labels = list(common_taxa)
-            
-            # Create a filter for taxa to keep
-            def filter_fn(taxon):
-                return taxon.label in common_taxa_labels
-            
-            # Prune trees
-            true_tree.retain_taxa_with_labels(common_taxa_labels)
-            estimated_tree.retain_taxa_with_labels(common_taxa_labels)
-        
-        # Encode bipartitions for comparison
-        true_tree.encode_bipartitions()
-        estimated_tree.encode_bipartitions()
-        
-        # Calculate Robinson-Foulds distance
-        rf_dist = treecompare.symmetric_difference(true_tree, estimated_tree)
-        
-        # Calculate FN and FP rates
-        true_splits = set(b.split_bitmask for b in true_tree.bipartition_encoding)
-        est_splits = set(b.split_bitmask for b in estimated_tree.bipartition_encoding)
-        
-        # Calculate FN rate (proportion of true splits missed)
-        missing_splits = true_splits - est_splits
-        FN = len(missing_splits) / (len(true_splits) if true_splits else 1)
-        
-        # Calculate FP rate (proportion of estimated splits not in true tree)
-        extra_splits = est_splits - true_splits
-        FP = len(extra_splits) / (len(est_splits) if est_splits else 1)
-        
-        # Write results to file
-        with open(output_file, 'w') as f:
-            f.write(f"Tree comparison results:\n")
-            f.write(f"RF distance: {rf_dist}\n")
-            f.write(f"FN rate: {FN}\n")
-            f.write(f"FP rate: {FP}\n")
-        
-        print(f"Tree comparison completed: {output_file}")
-        
+        true_taxa_list, true_mat = _load_or_build_splits(true_tree_file)
     except Exception as e:
-        print(f"Error in tree comparison: {e}")
-        with open(output_file, 'w') as f:
-            f.write(f"Tree comparison error: {str(e)}\n")
+        _write_error(output_file, e)
+        return
+    
+    _compare_to_true(true_taxa_list, true_mat, estimated_tree_file, output_file)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
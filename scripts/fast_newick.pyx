@@ -0,0 +1,156 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Minimal Newick tokenizer for tree comparison
+Only the topology and the leaf labels are kept; branch lengths, internal
+node labels (e.g. FastTree support values) and [comments] are skipped.
+"""
+
+import mmap
+from collections import Counter
+import numpy as np
+from cpython.unicode cimport PyUnicode_DecodeUTF8
+from libc.stdint cimport uint8_t
+
+cdef extern from "newick_scan.h":
+    size_t next_delim(const uint8_t *p, size_t n) nogil
+
+
+class ParseError(ValueError):
+    """Raised when the input is not a Newick tree (e.g. a Nexus file)."""
+
+
+def parse_newick(path):
+    """Parse the first tree of a Newick file.
+
+    Returns (parent, labels): parent[i] is the id of the parent of node i
+    (-1 for the root) and labels[i] is the label of leaf i, or None for
+    internal nodes. Nodes are numbered in preorder, so every parent id is
+    smaller than the ids of its children.
+    """
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return _parse(b'')
+        try:
+            return _parse(data)
+        finally:
+            data.close()
+
+
+def parse_newick_string(data):
+    """Parse the first tree of a Newick string; returns the same as parse_newick."""
+    return _parse(data.encode())
+
+
+cdef inline str _label(const uint8_t *p, Py_ssize_t n):
+    return PyUnicode_DecodeUTF8(<const char *>p, n, NULL)
+
+
+def _parse(data):
+    cdef const uint8_t[::1] view = data
+    cdef Py_ssize_t n = view.shape[0]
+    cdef const uint8_t *buf = &view[0] if n else NULL
+    cdef Py_ssize_t i = 0, start, cap = 1
+    cdef int depth = 0
+    cdef int n_nodes = 0
+    cdef bint filled = False  # current child slot already holds a node
+    cdef uint8_t c
+    labels = []
+
+    # Every node is opened by '(' or follows '(' or ','
+    for i in range(n):
+        if buf[i] == b'(' or buf[i] == b',':
+            cap += 1
+    parent_arr = np.empty(cap, dtype=np.int32)
+    cdef int[::1] parent = parent_arr
+    cdef int[::1] stack = np.empty(cap, dtype=np.int32)
+
+    # Skip leading blanks and comments such as DendroPy's "[&R] " rooting token
+    i = 0
+    while i < n:
+        if buf[i] <= b' ':
+            i += 1
+        elif buf[i] == b'[':
+            while i < n and buf[i] != b']':
+                i += 1
+            i += 1
+        else:
+            break
+    if i >= n or buf[i] != b'(':
+        raise ParseError("input does not start with '('")
+
+    while i < n:
+        c = buf[i]
+        if c == b'(':
+            if filled:
+                raise ParseError(f"unexpected '(' at byte {i}")
+            parent[n_nodes] = stack[depth - 1] if depth else -1
+            labels.append(None)
+            stack[depth] = n_nodes
+            depth += 1
+            n_nodes += 1
+            filled = False
+            i += 1
+        elif c == b',' or c == b')':
+            if depth == 0:
+                raise ParseError(f"unbalanced {chr(c)!r} at byte {i}")
+            if not filled:
+                # Unlabelled leaf, e.g. "(,)"
+                parent[n_nodes] = stack[depth - 1]
+                labels.append('')
+                n_nodes += 1
+            if c == b')':
+                depth -= 1
+                filled = True
+            else:
+                filled = False
+            i += 1
+        elif c == b':':
+            # Branch length: jump to the next delimiter
+            i += 1
+            i += next_delim(buf + i, n - i)
+        elif c == b'[':
+            while i < n and buf[i] != b']':
+                i += 1
+            i += 1
+        elif c == b';':
+            break
+        elif c <= b' ':
+            i += 1
+        else:
+            if depth == 0 and not filled:
+                raise ParseError(f"unexpected label at byte {i}")
+            if c == b"'":
+                i += 1
+                start = i
+                while i < n and not (buf[i] == b"'" and (i + 1 == n or buf[i + 1] != b"'")):
+                    i += 2 if buf[i] == b"'" else 1
+                i += 1
+                if not filled:
+                    labels.append(_label(buf + start, i - 1 - start).replace("''", "'"))
+            else:
+                start = i
+                i += next_delim(buf + i, n - i)
+                if not filled:
+                    labels.append(_label(buf + start, i - start))
+            # A label on a filled slot belongs to the node just closed (the root at depth 0);
+            # internal labels are ignored
+            if not filled:
+                parent[n_nodes] = stack[depth - 1]
+                n_nodes += 1
+                filled = True
+
+    if depth != 0:
+        raise ParseError("unbalanced parentheses")
+    _check_unique([label for label in labels if label is not None])
+    return parent_arr[:n_nodes], labels
+
+
+def _check_unique(leaves):
+    # Repeated labels (including several unlabelled leaves) would share one
+    # taxon bit and silently skew the split counts
+    if len(set(leaves)) != len(leaves):
+        dupes = sorted(label for label, count in Counter(leaves).items() if count > 1)
+        raise ValueError(f"Multiple occurrences of the same taxa: {', '.join(repr(d) for d in dupes)}")
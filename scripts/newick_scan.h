@@ -0,0 +1,78 @@
+/*
+ * Delimiter scan for fast_newick.pyx
+ * next_delim returns the offset of the first byte in p[0:n] that ends a
+ * Newick token: one of "(),:;[" or whitespace/control (<= ' '), or n if
+ * there is none. On x86-64 CPUs with AVX2 it tests 32 bytes per iteration;
+ * the check is made at runtime so the module can be built for a generic
+ * baseline and shared between hosts.
+ */
+#ifndef NEWICK_SCAN_H
+#define NEWICK_SCAN_H
+
+#include <stddef.h>
+#include <stdint.h>
+#if defined(__x86_64__) && (defined(__GNUC__) || defined(__clang__))
+#define NEWICK_SCAN_AVX2 1
+#include <immintrin.h>
+#endif
+
+static inline int is_delim(uint8_t c)
+{
+    return c <= ' ' || c == '(' || c == ')' || c == ',' || c == ':' || c == ';' || c == '[';
+}
+
+static inline size_t next_delim_scalar(const uint8_t *p, size_t n)
+{
+    size_t i;
+    for (i = 0; i < n; i++) {
+        if (is_delim(p[i]))
+            return i;
+    }
+    return n;
+}
+
+#ifdef NEWICK_SCAN_AVX2
+__attribute__((target("avx2")))
+static size_t next_delim_avx2(const uint8_t *p, size_t n)
+{
+    size_t i = 0;
+    const __m256i open = _mm256_set1_epi8('(');
+    const __m256i close = _mm256_set1_epi8(')');
+    const __m256i comma = _mm256_set1_epi8(',');
+    const __m256i colon = _mm256_set1_epi8(':');
+    const __m256i semi = _mm256_set1_epi8(';');
+    const __m256i bracket = _mm256_set1_epi8('[');
+    const __m256i space = _mm256_set1_epi8(' ');
+    for (; i + 32 <= n; i += 32) {
+        __m256i v = _mm256_loadu_si256((const __m256i *)(p + i));
+        __m256i m = _mm256_or_si256(_mm256_cmpeq_epi8(v, open), _mm256_cmpeq_epi8(v, close));
+        m = _mm256_or_si256(m, _mm256_cmpeq_epi8(v, comma));
+        m = _mm256_or_si256(m, _mm256_cmpeq_epi8(v, colon));
+        m = _mm256_or_si256(m, _mm256_cmpeq_epi8(v, semi));
+        m = _mm256_or_si256(m, _mm256_cmpeq_epi8(v, bracket));
+        /* v <= ' ' (unsigned) */
+        m = _mm256_or_si256(m, _mm256_cmpeq_epi8(_mm256_min_epu8(v, space), v));
+        uint32_t mask = (uint32_t)_mm256_movemask_epi8(m);
+        if (mask)
+            return i + (size_t)__builtin_ctz(mask);
+    }
+    return i + next_delim_scalar(p + i, n - i);
+}
+#endif
+
+static inline size_t next_delim(const uint8_t *p, size_t n)
+{
+#ifdef NEWICK_SCAN_AVX2
+    /* -1 until the first call probes the CPU */
+    static int has_avx2 = -1;
+    if (has_avx2 < 0) {
+        __builtin_cpu_init();
+        has_avx2 = __builtin_cpu_supports("avx2") != 0;
+    }
+    if (has_avx2)
+        return next_delim_avx2(p, n);
+#endif
+    return next_delim_scalar(p, n);
+}
+
+#endif
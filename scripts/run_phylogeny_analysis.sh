@@ -41,11 +41,20 @@ echo "Using Python from: $PYTHON_PATH"
 echo "Checking for dendropy:"
 $PYTHON_PATH -c "import sys; print(sys.path); import dendropy; print(f'DendroPy version: {dendropy.__version__}')" || echo "Dendropy not found in Python path"
 
+# Print one quoted CSV row, doubling any quotes so commas and quotes in paths survive
+csv_row() {
+    printf '"%s","%s","%s"\n' "${1//\"/\"\"}" "${2//\"/\"\"}" "${3//\"/\"\"}"
+}
+
 # Run on both model conditions
 for MODEL_COND in "1000M1" "1000M4"; do
     echo "Processing model condition: $MODEL_COND"
     mkdir -p $RESULTS_DIR/$MODEL_COND
     
+    # Manifest of (true tree, estimated tree, output) comparisons to run
+    MANIFEST="$RESULTS_DIR/$MODEL_COND/comparisons.csv"
+    echo "true_tree,estimated_tree,output" > "$MANIFEST"
+    
     # Process replicates (R0 through R4)
     for REP in {0..19}; do
         REP_DIR="$DATASET_DIR/$MODEL_COND/R$REP"
@@ -190,42 +199,19 @@ except Exception as e:
             fi
         done
         
-        # Compare trees to true tree
-        if [ ! -f "$OUT_DIR/fasttree_gtr_comparison.txt" ] && [ -f "$OUT_DIR/fasttree_gtr.tree" ] && [ -s "$OUT_DIR/fasttree_gtr.tree" ]; then
-            echo "    Comparing FastTree GTR to true tree"
-            $PYTHON_PATH compare_trees.py "$OUT_DIR/fasttree_gtr.tree" "$TRUE_TREE" "$OUT_DIR/fasttree_gtr_comparison.txt"
-        else
-            echo "    FastTree GTR comparison already completed or tree file missing, skipping"
-        fi
-        
-        if [ ! -f "$OUT_DIR/fasttree_jc_comparison.txt" ] && [ -f "$OUT_DIR/fasttree_jc.tree" ] && [ -s "$OUT_DIR/fasttree_jc.tree" ]; then
-            echo "    Comparing FastTree JC to true tree"
-            $PYTHON_PATH compare_trees.py "$OUT_DIR/fasttree_jc.tree" "$TRUE_TREE" "$OUT_DIR/fasttree_jc_comparison.txt"
-        else
-            echo "    FastTree JC comparison already completed or tree file missing, skipping"
-        fi
-        
-        if [ ! -f "$OUT_DIR/nj_jc_comparison.txt" ] && [ -f "$OUT_DIR/nj_jc.tree" ] && [ -s "$OUT_DIR/nj_jc.tree" ]; then
-            echo "    Comparing NJ JC to true tree"
-            $PYTHON_PATH compare_trees.py "$OUT_DIR/nj_jc.tree" "$TRUE_TREE" "$OUT_DIR/nj_jc_comparison.txt"
-        else
-            echo "    NJ JC comparison already completed or tree file missing, skipping"
-        fi
-        
-        if [ ! -f "$OUT_DIR/nj_logdet_comparison.txt" ] && [ -f "$OUT_DIR/nj_logdet.tree" ] && [ -s "$OUT_DIR/nj_logdet.tree" ]; then
-            echo "    Comparing NJ LogDet to true tree"
-            $PYTHON_PATH compare_trees.py "$OUT_DIR/nj_logdet.tree" "$TRUE_TREE" "$OUT_DIR/nj_logdet_comparison.txt"
-        else
-            echo "    NJ LogDet comparison already completed or tree file missing, skipping"
-        fi
-        
-        if [ ! -f "$OUT_DIR/nj_pdist_comparison.txt" ] && [ -f "$OUT_DIR/nj_pdist.tree" ] && [ -s "$OUT_DIR/nj_pdist.tree" ]; then
-            echo "    Comparing NJ p-distance to true tree"
-            $PYTHON_PATH compare_trees.py "$OUT_DIR/nj_pdist.tree" "$TRUE_TREE" "$OUT_DIR/nj_pdist_comparison.txt"
-        else
-            echo "    NJ p-distance comparison already completed or tree file missing, skipping"
-        fi
+        # Queue comparisons of each estimated tree to the true tree
+        for METHOD in fasttree_gtr fasttree_jc nj_jc nj_logdet nj_pdist; do
+            if [ ! -f "$OUT_DIR/${METHOD}_comparison.txt" ] && [ -f "$OUT_DIR/$METHOD.tree" ] && [ -s "$OUT_DIR/$METHOD.tree" ]; then
+                csv_row "$TRUE_TREE" "$OUT_DIR/$METHOD.tree" "$OUT_DIR/${METHOD}_comparison.txt" >> "$MANIFEST"
+            else
+                echo "    $METHOD comparison already completed or tree file missing, skipping"
+            fi
+        done
     done
+    
+    # Compare all queued trees for this model condition in a single process
+    echo "  Comparing estimated trees to true trees for $MODEL_COND"
+    $PYTHON_PATH compare_trees.py --manifest "$MANIFEST"
 done
 
 # Summarize results
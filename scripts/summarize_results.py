@@ -6,29 +6,44 @@ Usage: python summarize_results.py <results_directory>
 
 import sys
 import os
-import pandas as pd
+import re
+from concurrent.futures import ProcessPoolExecutor
+import polars as pl
+import pyarrow.csv as pacsv
 import numpy as np
 import matplotlib.pyplot as plt
 
+_PAT = re.compile(
+    rb"RF distance:\s*(?P<RF>\S+).*?FN rate:\s*(?P<FN>\S+).*?FP rate:\s*(?P<FP>\S+)",
+    re.DOTALL
+)
+
 def parse_comparison_file(file_path):
     """Parse a comparison file and extract RF, FN, and FP values."""
-    results = {}
     try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                if "RF distance:" in line:
-                    value = line.split(":")[1].strip()
-                    results['RF'] = float(value) if value != 'N/A' else np.nan
-                elif "FN rate:" in line:
-                    value = line.split(":")[1].strip()
-                    results['FN'] = float(value) if value != 'N/A' else np.nan
-                elif "FP rate:" in line:
-                    value = line.split(":")[1].strip()
-                    results['FP'] = float(value) if value != 'N/A' else np.nan
+        with open(file_path, 'rb') as f:
+            m = _PAT.search(f.read())
+        if m is None:
+            return {}
+        return {key: np.nan if value == b'N/A' else float(value) for key, value in m.groupdict().items()}
     except Exception as e:
         print(f"Error parsing {file_path}: {e}")
-        results = {'RF': np.nan, 'FN': np.nan, 'FP': np.nan}
-    return results
+        return {'RF': np.nan, 'FN': np.nan, 'FP': np.nan}
+
+def _worker_count():
+    """Return the number of CPUs this job may use (not every core on the node)."""
+    if os.environ.get("SLURM_NTASKS"):
+        return int(os.environ["SLURM_NTASKS"])
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def write_csv(df, path):
+    """Write a polars DataFrame through Arrow's multi-threaded C++ CSV writer."""
+    # Replicate is whatever directory name was found on disk and may contain
+    # delimiters, so quote strings; the fixed column names never need it
+    options = pacsv.WriteOptions(quoting_style='needed', quoting_header='none')
+    pacsv.write_csv(df.to_arrow(), path, options)
 
 def main():
     if len(sys.argv) != 2:
@@ -37,11 +52,11 @@ def main():
     
     results_dir = sys.argv[1]
     
-    # Create a dataframe to store results
-    columns = ['Model', 'Method', 'Replicate', 'RF', 'FN', 'FP']
-    results_df = pd.DataFrame(columns=columns)
+    # (model, method, replicate, path) of every comparison file to parse
+    tasks = []
     
-    # Methods to analyze
+    # Model conditions and methods to analyze
+    models = ['1000M1', '1000M4']
     methods = {
         'fasttree_gtr': 'FastTree (GTR)',
         'fasttree_jc': 'FastTree (JC)',
@@ -51,53 +66,73 @@ def main():
     }
     
     # Process each model condition
-    for model in ['1000M1', '1000M4']:
+    for model in models:
         model_dir = os.path.join(results_dir, model)
         if not os.path.exists(model_dir):
             print(f"Warning: Model directory {model_dir} does not exist")
             continue
             
         # Process each replicate
-        for rep_dir in os.listdir(model_dir):
-            rep_path = os.path.join(model_dir, rep_dir)
-            if not os.path.isdir(rep_path):
-                continue
-                
-            # Extract replicate number
-            rep = rep_dir  # e.g., "R1"
+        with os.scandir(model_dir) as it:
+            rep_entries = [entry for entry in it if entry.is_dir()]
+        
+        for rep_entry in rep_entries:
+            rep = rep_entry.name  # e.g., "R1"
+            
+            # Find the comparison files in one directory listing
+            with os.scandir(rep_entry.path) as it:
+                present = {entry.name: entry.path for entry in it if entry.name.endswith('_comparison.txt')}
             
             # Process each method
             for method_key, method_name in methods.items():
-                comparison_file = os.path.join(rep_path, f'{method_key}_comparison.txt')
+                comparison_file = present.get(f'{method_key}_comparison.txt')
                 
-                if os.path.exists(comparison_file):
-                    results = parse_comparison_file(comparison_file)
-                    
-                    # Add to dataframe
-                    new_row = {
-                        'Model': model,
-                        'Method': method_name,
-                        'Replicate': rep,
-                        'RF': results.get('RF', np.nan),
-                        'FN': results.get('FN', np.nan),
-                        'FP': results.get('FP', np.nan)
-                    }
-                    results_df = pd.concat([results_df, pd.DataFrame([new_row])], ignore_index=True)
+                if comparison_file is not None:
+                    tasks.append((model, method_name, rep, comparison_file))
+    
+    # Parse the files in parallel; chunks amortize IPC over the tiny per-file work
+    with ProcessPoolExecutor(max_workers=_worker_count()) as executor:
+        parsed = list(executor.map(parse_comparison_file, [task[3] for task in tasks], chunksize=64))
+    
+    # Collect result rows; the dataframe is built once after parsing
+    rows = []
+    for (model, method_name, rep, _), results in zip(tasks, parsed):
+        rows.append({
+            'Model': model,
+            'Method': method_name,
+            'Replicate': rep,
+            'RF': results.get('RF', np.nan),
+            'FN': results.get('FN', np.nan),
+            'FP': results.get('FP', np.nan)
+        })
+    
+    # Enum keys over the known vocabulary group and sort on small integer codes;
+    # NaN becomes null so the aggregations skip missing values
+    results_df = pl.from_dicts(rows, schema={
+        'Model': pl.Enum(models),
+        'Method': pl.Enum(list(methods.values())),
+        'Replicate': pl.Categorical,
+        'RF': pl.Float64,
+        'FN': pl.Float64,
+        'FP': pl.Float64
+    }).with_columns(pl.col('RF', 'FN', 'FP').fill_nan(None))
     
     # Save raw results to CSV
     raw_file = os.path.join(results_dir, 'raw_results.csv')
-    results_df.to_csv(raw_file, index=False)
+    write_csv(results_df, raw_file)
     print(f"Raw results saved to {raw_file}")
     
     # Calculate average metrics for each method and model
-    summary_df = results_df.groupby(['Model', 'Method']).agg({
-        'FN': ['mean', 'std'],
-        'FP': ['mean', 'std']
-    }).reset_index()
+    summary_df = results_df.lazy().group_by(['Model', 'Method']).agg([
+        pl.col('FN').mean().alias('FN_mean'),
+        pl.col('FN').std().alias('FN_std'),
+        pl.col('FP').mean().alias('FP_mean'),
+        pl.col('FP').std().alias('FP_std')
+    ]).sort(['Model', 'Method']).collect()
     
     # Save summary to CSV
     summary_file = os.path.join(results_dir, 'summary_results.csv')
-    summary_df.to_csv(summary_file)
+    write_csv(summary_df, summary_file)
     print(f"Summary results saved to {summary_file}")
     
     # Create plots
@@ -106,47 +141,35 @@ def main():
 def create_plots(df, results_dir):
     """Create plots to visualize results."""
     # Skip plotting if no valid data
-    if df.empty or df['FN'].isna().all() or df['FP'].isna().all():
+    if df.is_empty() or df['FN'].is_null().all() or df['FP'].is_null().all():
         print("Warning: Not enough valid data for plotting")
         return
-        
-    # Average FN rates by method and model
-    plt.figure(figsize=(12, 6))
-    
-    # Group by model and method, then calculate mean FN
-    fn_means = df.groupby(['Model', 'Method'])['FN'].mean().reset_index()
     
-    # Pivot to create a table suitable for grouped bar chart
-    fn_pivot = fn_means.pivot(index='Method', columns='Model', values='FN')
-    
-    # Plot grouped bar chart
-    ax = fn_pivot.plot(kind='bar', capsize=4)
-    
-    plt.title('Average False Negative Rates by Method and Model')
-    plt.ylabel('False Negative Rate')
-    plt.xlabel('Method')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(os.path.join(results_dir, 'fn_rates_by_method.png'))
-    
-    # Average FP rates by method and model
-    plt.figure(figsize=(12, 6))
-    
-    # Group by model and method, then calculate mean FP
-    fp_means = df.groupby(['Model', 'Method'])['FP'].mean().reset_index()
-    
-    # Pivot to create a table suitable for grouped bar chart
-    fp_pivot = fp_means.pivot(index='Method', columns='Model', values='FP')
-    
-    # Plot grouped bar chart
-    ax = fp_pivot.plot(kind='bar', capsize=4)
-    
-    plt.title('Average False Positive Rates by Method and Model')
-    plt.ylabel('False Positive Rate')
-    plt.xlabel('Method')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(os.path.join(results_dir, 'fp_rates_by_method.png'))
+    # Group by model and method once, then calculate mean FN and FP together
+    means = df.group_by(['Model', 'Method']).agg(pl.col('FN', 'FP').mean()).sort('Model')
+    
+    # Average FN and FP rates side by side in a single figure
+    fig, axes = plt.subplots(1, 2, figsize=(16, 6))
+    for ax, metric, name in zip(axes, ['FN', 'FP'], ['False Negative', 'False Positive']):
+        # Pivot to a Method x Model table for the grouped bar chart
+        pivot = means.pivot(index='Method', on='Model', values=metric).sort('Method')
+        models = pivot.columns[1:]
+        values = pivot.select(models).to_numpy()
+        x = np.arange(pivot.height)
+        width = 0.8 / len(models)
+        for j, model in enumerate(models):
+            ax.bar(x + (j - (len(models) - 1) / 2) * width, values[:, j], width, label=model)
+        
+        ax.set_title(f'Average {name} Rates by Method and Model')
+        ax.set_ylabel(f'{name} Rate')
+        ax.set_xlabel('Method')
+        ax.set_xticks(x)
+        ax.set_xticklabels(pivot['Method'].to_list(), rotation=45)
+        ax.legend(title='Model')
+    
+    fig.tight_layout()
+    fig.savefig(os.path.join(results_dir, 'rates_by_method.png'))
+    plt.close(fig)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
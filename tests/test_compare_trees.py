@@ -0,0 +1,100 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")))
+
+import compare_trees
+
+dendropy = pytest.importorskip("dendropy")
+from dendropy.calculate import treecompare
+
+
+def _random_tree(rng, labels):
+    """Random tree over labels as nested lists, with occasional polytomies."""
+    nodes = list(labels)
+    while len(nodes) > 3:
+        k = 3 if rng.random() < 0.1 and len(nodes) > 4 else 2
+        children = [nodes.pop(rng.randrange(len(nodes))) for _ in range(k)]
+        nodes.append(children)
+    return nodes
+
+
+def _newick(node, rng):
+    if isinstance(node, list):
+        text = "(" + ",".join(_newick(child, rng) for child in node) + ")"
+    else:
+        text = node
+    return text + (f":{rng.random():.3f}" if rng.random() < 0.5 else "")
+
+
+def _perturb(rng, node, swaps, renames):
+    """Copy a tree, swapping leaf labels pairwise and renaming a few leaves."""
+    leaves = []
+    def collect(n):
+        for child in n:
+            if isinstance(child, list):
+                collect(child)
+            else:
+                leaves.append(child)
+    collect(node)
+    mapping = {label: label for label in leaves}
+    for _ in range(swaps):
+        a, b = rng.sample(leaves, 2)
+        mapping[a], mapping[b] = mapping[b], mapping[a]
+    for i, label in enumerate(rng.sample(leaves, renames)):
+        mapping[label] = f"new{i}"
+    def copy(n):
+        return [copy(child) if isinstance(child, list) else mapping[child] for child in n]
+    return copy(node)
+
+
+def _dendropy_result(est_newick, true_newick):
+    taxa = dendropy.TaxonNamespace()
+    true_tree = dendropy.Tree.get(data=true_newick, schema="newick", taxon_namespace=taxa, rooting="force-unrooted")
+    est_tree = dendropy.Tree.get(data=est_newick, schema="newick", taxon_namespace=taxa, rooting="force-unrooted")
+    common = {leaf.taxon.label for leaf in true_tree.leaf_node_iter()} & {leaf.taxon.label for leaf in est_tree.leaf_node_iter()}
+    true_tree.retain_taxa_with_labels(common)
+    est_tree.retain_taxa_with_labels(common)
+    true_splits = {b.split_bitmask for b in true_tree.encode_bipartitions() if not b.is_trivial()}
+    est_splits = {b.split_bitmask for b in est_tree.encode_bipartitions() if not b.is_trivial()}
+    rf = treecompare.symmetric_difference(true_tree, est_tree)
+    assert rf == len(true_splits ^ est_splits)
+    return {
+        'common_taxa': len(common),
+        'RF': rf,
+        'FN': len(true_splits - est_splits) / len(true_splits),
+        'FP': len(est_splits - true_splits) / len(est_splits)
+    }
+
+
+@pytest.mark.parametrize("n_taxa", [8, 63, 64, 65, 66, 129, 200])
+@pytest.mark.parametrize("pruned", [False, True])
+def test_matches_dendropy(n_taxa, pruned):
+    rng = random.Random(n_taxa * 2 + pruned)
+    labels = [f"t{i}" for i in range(n_taxa)]
+    for _ in range(10):
+        true_tree = _random_tree(rng, labels)
+        renames = rng.randint(1, n_taxa // 4) if pruned else 0
+        # A perturbed copy shares most splits; an independent tree almost none
+        if rng.random() < 0.8:
+            est_tree = _perturb(rng, true_tree, rng.randint(0, 3), renames)
+        else:
+            est_tree = _perturb(rng, _random_tree(rng, labels), 0, renames)
+        true_newick = _newick(true_tree, rng) + ";"
+        est_newick = _newick(est_tree, rng) + ";"
+
+        result = compare_trees.compare_trees_from_strings(est_newick, true_newick)
+        expected = _dendropy_result(est_newick, true_newick)
+        assert result['common_taxa'] == expected['common_taxa']
+        assert result['RF'] == expected['RF']
+        assert result['FN'] == pytest.approx(expected['FN'])
+        assert result['FP'] == pytest.approx(expected['FP'])
+
+
+def test_too_few_common_taxa():
+    result = compare_trees.compare_trees_from_strings("((A,B),(X,Y));", "((A,B),(C,D));")
+    assert result['common_taxa'] == 2
+    assert result['RF'] is None
@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")))
+
+import pyximport
+pyximport.install(language_level=3)
+import fast_newick
+
+
+def _clades(parents, labels):
+    """Return the set of leaf-label sets below each node."""
+    below = [set() for _ in labels]
+    for i in range(len(labels) - 1, -1, -1):
+        if labels[i] is not None:
+            below[i].add(labels[i])
+        if parents[i] >= 0:
+            below[parents[i]] |= below[i]
+    return {frozenset(s) for s in below}
+
+
+def test_lengths_internal_labels_and_comments():
+    parents, labels = fast_newick.parse_newick_string(
+        "((A:1,'B c'':d'):0.5[&x],(C,  D)0.9:2)root;")
+    assert parents.tolist() == [-1, 0, 1, 1, 0, 4, 4]
+    assert labels == [None, None, "A", "B c':d", None, "C", "D"]
+
+
+def test_long_labels():
+    name = "X" * 70
+    _, labels = fast_newick.parse_newick_string(f"(({name}_1,{name}_2),{name}_3);")
+    assert [label for label in labels if label] == [f"{name}_1", f"{name}_2", f"{name}_3"]
+
+
+@pytest.mark.parametrize("rooting", ["force-rooted", "force-unrooted"])
+def test_dendropy_written_newick(tmp_path, rooting):
+    # run_phylogeny_analysis.sh rewrites every tree with DendroPy, which
+    # prefixes force-rooted trees with "[&R] "
+    dendropy = pytest.importorskip("dendropy")
+    tree = dendropy.Tree.get(
+        data="((A:1,B:2)0.9:1,(C,(D,E)),F);",
+        schema="newick",
+        rooting=rooting
+    )
+    path = tmp_path / "tree.tre"
+    tree.write(path=str(path), schema="newick")
+
+    parents, labels = fast_newick.parse_newick(str(path))
+    expected = {
+        frozenset(leaf.taxon.label for leaf in node.leaf_iter())
+        for node in tree.preorder_node_iter()
+    }
+    assert _clades(parents, labels) == expected
+
+
+@pytest.mark.parametrize("data", ["#NEXUS\nbegin trees;", "(A,B", "(A,B));", "A;", ""])
+def test_rejects_non_newick(data):
+    with pytest.raises(fast_newick.ParseError):
+        fast_newick.parse_newick_string(data)
+
+
+@pytest.mark.parametrize("data", ["((A,B),(C,D),(A,F));", "((,B),(C,D),(,F));"])
+def test_rejects_repeated_labels(data):
+    with pytest.raises(ValueError, match="Multiple occurrences") as e:
+        fast_newick.parse_newick_string(data)
+    # Not a ParseError, so the caller does not retry the file as Nexus
+    assert not isinstance(e.value, fast_newick.ParseError)
+
+
+@pytest.mark.parametrize("root_label", ["r", "'r(x)'", "'r;'':[x]'"])
+def test_root_labels(root_label):
+    parents, labels = fast_newick.parse_newick_string(f"(A,(B,C)'i,(1)'){root_label}:0.1;")
+    assert parents.tolist() == [-1, 0, 0, 2, 2]
+    assert labels == [None, "A", None, "B", "C"]